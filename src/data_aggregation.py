@@ -0,0 +1,331 @@
+"""
+USOS 2024 ARC Campaign Processing
+
+Command line entry point over data_ag and geo_map. Splits a date range into shards
+so each day can be processed by its own Slurm array task, or locally with a process pool.
+
+Each processed day writes its own results and a completion manifest, so a timed out job
+resumes without redoing finished days. The reduce step combines the per-day outputs.
+
+Usage:
+
+    # Slurm array task, 0-based ids, task i handles day i of the range (SLURM_ARRAY_TASK_ID)
+    python src/data_aggregation.py --start-date 20240716 --end-date 20240804
+
+    # Local, no scheduler
+    python src/data_aggregation.py --start-date 20240716 --end-date 20240804 --workers 4
+
+    # Combine per-day outputs
+    python src/data_aggregation.py --start-date 20240716 --end-date 20240804 --reduce
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+import data_ag
+
+
+MANIFEST_NAME = "manifest.json"
+
+
+def date_range(start_date, end_date):
+    """
+    Returns every day between start_date and end_date (inclusive) as YYYYMMDD strings.
+    """
+    start = datetime.strptime(start_date, '%Y%m%d')
+    end = datetime.strptime(end_date, '%Y%m%d')
+
+    if end < start:
+        raise ValueError(f"End date {end_date} is before start date {start_date}")
+
+    return [(start + timedelta(days=i)).strftime('%Y%m%d') for i in range((end - start).days + 1)]
+
+
+def shard_dates(dates, task_id, task_count):
+    """
+    Returns the days handled by one array task, dealt round-robin across task_count shards.
+    The mapping only depends on task_id and task_count, so resubmitting a subset of array
+    ids reprocesses the same days. Ids past the last shard get no days.
+    """
+    if task_id < 0 or task_count < 1:
+        raise ValueError(f"Invalid task id {task_id} for {task_count} tasks")
+
+    if task_id >= task_count:
+        return []
+
+    return dates[task_id::task_count]
+
+
+def raw_file(raw_dir, date):
+    """
+    Path to the raw ARC ICARTT file for a given day.
+    """
+    return Path(raw_dir) / f"USOS-ARL-Suite_ARC_{date}_RA.ict"
+
+
+def day_dir(out_dir, date):
+    """
+    Output directory for a given day, matches data_ag output layout (output/arc/<date>/).
+    """
+    return Path(out_dir) / date
+
+
+def read_manifest(out_dir, date):
+    """
+    Reads the manifest for a day, None if the day has not finished.
+    """
+    path = day_dir(out_dir, date) / MANIFEST_NAME
+    if not path.exists():
+        return None
+
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def is_complete(out_dir, date, map_dir=None):
+    """
+    True if the day has a 'done' manifest listing every requested output, and those
+    outputs exist on disk (csv always, map when map_dir is set).
+    """
+    manifest = read_manifest(out_dir, date)
+    if manifest is None or manifest.get('status', 'done') != 'done':
+        return False
+
+    required = ['csv'] + (['map'] if map_dir is not None else [])
+    outputs = manifest.get('outputs', {})
+
+    return all(k in outputs and Path(outputs[k]).exists() for k in required)
+
+
+def write_manifest(out_dir, date, outputs, status='done'):
+    """
+    Writes the manifest for a day. Written last, via rename, so a job killed mid-day
+    never leaves a manifest behind for partial results.
+
+    status is 'done' for processed days or 'missing' when there is no raw file,
+    so reduce can tell days without data apart from days that never finished.
+    """
+    path = day_dir(out_dir, date) / MANIFEST_NAME
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    manifest = {
+        'date': date,
+        'status': status,
+        'outputs': {k: str(v) for k, v in outputs.items()},
+        'completed': datetime.now().isoformat(timespec='seconds'),
+    }
+
+    tmp = path.with_suffix('.tmp')
+
+    with open(tmp, 'w') as fh:
+        json.dump(manifest, fh, indent=2)
+
+    os.replace(tmp, path)
+
+
+def process_day(date, raw_dir, out_dir, map_dir=None, force=False):
+    """
+    Processes a single ARC day: aggregated csv, optional folium map, then the manifest.
+
+    Returns
+
+        str
+        'done', 'skipped' (already complete) or 'missing' (no raw file for the day)
+    """
+    if not force and is_complete(out_dir, date, map_dir):
+        print(f"Skipping {date}, already complete")
+        return 'skipped'
+
+    filename = raw_file(raw_dir, date)
+    if not filename.exists():
+        print(f"No ARC file for {date}: {filename}")
+        write_manifest(out_dir, date, {}, status='missing')
+        return 'missing'
+
+    out = day_dir(out_dir, date)
+    out.mkdir(parents=True, exist_ok=True)
+
+    df = data_ag.read_ARC(filename)
+    if df.empty:
+        raise RuntimeError(f"ARC file for {date} produced no records")
+
+    outputs = {'csv': out / f"{date}.csv"}
+    df.to_csv(outputs['csv'])
+
+    if map_dir is not None:
+        # folium is only needed when maps are requested
+        import geo_map
+
+        Path(map_dir).mkdir(parents=True, exist_ok=True)
+        outputs['map'] = Path(map_dir) / f"arc_data_mapping_{date}.html"
+        geo_map.map_day(date, filename, outputs['map'])
+
+    write_manifest(out_dir, date, outputs)
+
+    print(f"Completed {date}")
+    return 'done'
+
+
+def run(dates, raw_dir, out_dir, map_dir=None, workers=1, force=False):
+    """
+    Processes days serially or with a local process pool.
+
+    Returns
+
+        dict
+        Day -> status, failed days are recorded as 'failed'
+    """
+    status = {}
+
+    if workers <= 1:
+        for date in dates:
+            try:
+                status[date] = process_day(date, raw_dir, out_dir, map_dir, force)
+            except Exception as e:
+                print(f"Error processing {date}: {e}")
+                status[date] = 'failed'
+        return status
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(process_day, date, raw_dir, out_dir, map_dir, force): date for date in dates}
+
+        for future in as_completed(futures):
+            date = futures[future]
+            try:
+                status[date] = future.result()
+            except Exception as e:
+                print(f"Error processing {date}: {e}")
+                status[date] = 'failed'
+
+    return status
+
+
+def reduce_days(dates, out_dir, output=None, allow_partial=False):
+    """
+    Combines the per-day csv outputs of all completed days into a single campaign csv.
+
+    Days recorded as 'missing' (no raw file) are left out. Days that never finished
+    raise a RuntimeError unless allow_partial is set.
+
+    Returns
+
+        pd.DataFrame
+        Combined dataset with datetime index
+    """
+    frames = []
+    missing = []
+    unfinished = []
+
+    for date in dates:
+        manifest = read_manifest(out_dir, date)
+
+        if manifest is not None and manifest.get('status') == 'missing':
+            missing.append(date)
+            continue
+
+        if not is_complete(out_dir, date):
+            unfinished.append(date)
+            continue
+
+        csv = day_dir(out_dir, date) / f"{date}.csv"
+        df = pd.read_csv(csv)
+        if 'TIMESTAMP' not in df.columns:
+            raise ValueError(f"{csv} has no TIMESTAMP column, ARC file for {date} had no usable time fields")
+
+        df['TIMESTAMP'] = pd.to_datetime(df['TIMESTAMP'])
+        frames.append(df.set_index('TIMESTAMP'))
+
+    if missing:
+        print(f"No ARC data for: {', '.join(missing)}")
+
+    if unfinished:
+        message = f"Days not processed: {', '.join(unfinished)}"
+        if not allow_partial:
+            raise RuntimeError(message + " (rerun them, or pass --allow-partial)")
+        print(message)
+
+    if not frames:
+        print("No completed days to combine")
+        return pd.DataFrame()
+
+    combined = pd.concat(frames).sort_index()
+
+    if output is None:
+        output = Path(out_dir) / f"arc_{dates[0]}_{dates[-1]}.csv"
+
+    combined.to_csv(output)
+
+    print(f"Combined {len(frames)} days, {len(combined)} records: {output}")
+    return combined
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Process USOS ARC campaign data by day.")
+
+    parser.add_argument('--start-date', required=True, help="First day, YYYYMMDD")
+    parser.add_argument('--end-date', required=True, help="Last day (inclusive), YYYYMMDD")
+    parser.add_argument('--raw-dir', default='data/raw/arc_raw', help="Directory of raw ARC .ict files")
+    parser.add_argument('--out-dir', default='output/arc', help="Per-day output directory")
+    parser.add_argument('--map-dir', default=None, help="Also write folium maps to this directory")
+    parser.add_argument('--task-id', type=int, default=None,
+                        help="0-based shard index, defaults to SLURM_ARRAY_TASK_ID")
+    parser.add_argument('--task-count', type=int, default=None,
+                        help="Number of shards, defaults to one per day in the range")
+    parser.add_argument('--workers', type=int, default=1, help="Local process pool size")
+    parser.add_argument('--force', action='store_true', help="Reprocess days that are already complete")
+    parser.add_argument('--reduce', action='store_true', help="Combine completed per-day outputs and exit")
+    parser.add_argument('--output', default=None, help="Combined csv path for --reduce")
+    parser.add_argument('--allow-partial', action='store_true',
+                        help="Let --reduce combine even if some days never finished")
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+
+    args = parse_args(argv)
+
+    dates = date_range(args.start_date, args.end_date)
+
+    if args.reduce:
+        try:
+            reduce_days(dates, args.out_dir, args.output, args.allow_partial)
+        except (RuntimeError, ValueError) as e:
+            print(f"Error combining days: {e}")
+            return 1
+        return 0
+
+    task_id = args.task_id
+    if task_id is None and 'SLURM_ARRAY_TASK_ID' in os.environ:
+        task_id = int(os.environ['SLURM_ARRAY_TASK_ID'])
+
+    if task_id is not None:
+        # One task per day unless a shard count is given. Not taken from the array size,
+        # so resubmitting e.g. --array=7,12 keeps the same task -> day mapping.
+        task_count = args.task_count or len(dates)
+        dates = shard_dates(dates, task_id, task_count)
+
+        if not dates:
+            print(f"Task {task_id} has no days for {task_count} shards, nothing to do")
+            return 0
+
+    print(f"Processing {len(dates)} days: {', '.join(dates)}")
+
+    status = run(dates, args.raw_dir, args.out_dir, args.map_dir, args.workers, args.force)
+
+    failed = [d for d, s in status.items() if s == 'failed']
+    if failed:
+        print(f"Failed days: {', '.join(sorted(failed))}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
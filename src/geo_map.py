@@ -51,10 +51,14 @@ Valve, boolian, indicator of valve conditions;0 is measurement; 10 is zeroing; 1
 
 """
 
+import json
+import math
+
 import pandas as pd
 import folium
 import folium.plugins.timeline
 import branca.colormap as cm
+from branca.element import MacroElement, Template
 
 
 def main():
@@ -65,69 +69,79 @@ def main():
 
     for arcdate in arc_dates:
         file_name = f"arc_raw/USOS-ARL-Suite_ARC_{arcdate}_RA.ict"
+        filesave = f"arc_mapping/arc_data_mapping_{arcdate}.html"
+
+        map_day(arcdate, file_name, filesave)
+
+
+def map_day(arcdate, file_name, filesave):
+    """
+    Builds the full layered folium map for a single ARC day and saves it to html.
+    """
+
+    # Pandas dataframe
+    arc_data = arc_data_dataframe(file_name)
 
-        # Pandas dataframe
-        arc_data = arc_data_dataframe(file_name)
+    print(f"Generated folium mapping for: {arcdate}")
 
-        print(f"Generated folium mapping for: {arcdate}")
+    # ARC map with car path
+    m = arc_map(arc_data, file_name)
 
-        # ARC map with car path
-        m = arc_map(arc_data, file_name)
+    # Add Layers
+    add_layer(m, arc_data, 'CH4_aeris313_ppm')
+    add_layer(m, arc_data, 'H2O_aeris313_ppm')
+    add_layer(m, arc_data, 'CO2_g2401m_ppm')
+    add_layer(m, arc_data, 'alt_msl_m')
 
-        # Add Layers
-        add_layer(m, arc_data, 'CH4_aeris313_ppm')
-        add_layer(m, arc_data, 'H2O_aeris313_ppm')
-        add_layer(m, arc_data, 'CO2_g2401m_ppm')
-        add_layer(m, arc_data, 'alt_msl_m')
+    add_layer(m, arc_data, 'C2H6_aeris313_ppb')
+    add_layer(m, arc_data, 'C2C1_aeris313')
+    add_layer(m, arc_data, 'delta13C_CH4_raw')
 
-        add_layer(m, arc_data, 'C2H6_aeris313_ppb')
-        add_layer(m, arc_data, 'C2C1_aeris313')
-        add_layer(m, arc_data, 'delta13C_CH4_raw')
+    # Add Vector map
+    add_vector_map(m, arc_data, 'true_WS_m_s')
 
-        # Add Vector map
-        add_vector_map(m, arc_data, 'true_WS_m_s')
+    # Click anywhere for all values at the nearest fix
+    add_point_inspector(m, arc_data, arcdate)
 
-        # Add layer control
-        folium.LayerControl().add_to(m)
+    # Add layer control
+    folium.LayerControl().add_to(m)
+
+    # Add title
+    header_html = f"""
+    <div style="
+        position: fixed;
+        top: 10px;
+        right: 10px;
+        z-index: 9999;
+        text-align: center;
+    ">
+        <img src="https://csl.noaa.gov/groups/csl7/measurements/2024usos/images/logos/usos_logo.png"
+             alt="USOS Logo"
+             width="110px"
+             style="display:block; margin-bottom:5px;">
 
-        # Add title
-        header_html = f"""
         <div style="
-            position: fixed;
-            top: 10px;
-            right: 10px;
-            z-index: 9999;
-            text-align: center;
-        ">
-            <img src="https://csl.noaa.gov/groups/csl7/measurements/2024usos/images/logos/usos_logo.png"
-                 alt="USOS Logo"
-                 width="110px"
-                 style="display:block; margin-bottom:5px;">
-
-            <div style="
-                font-size: 19px;
-                font-weight: bold;
-                background-color: rgba(176, 216, 235);
-                padding: 4px 8px;
-                border-radius: 4px;
-         ">
-                <span style="color:#da8322;">{arcdate}</span> 
-            </div>
+            font-size: 19px;
+            font-weight: bold;
+            background-color: rgba(176, 216, 235);
+            padding: 4px 8px;
+            border-radius: 4px;
+     ">
+            <span style="color:#da8322;">{arcdate}</span> 
         </div>
-        """
-
-        # Add the HTML to the map
-        m.get_root().html.add_child(folium.Element(header_html))
+    </div>
+    """
 
-        print("Generating html file...")
+    # Add the HTML to the map
+    m.get_root().html.add_child(folium.Element(header_html))
 
-        filesave = f"arc_mapping/arc_data_mapping_{arcdate}.html"
+    print("Generating html file...")
 
-        # Save to html
-        m.save(filesave)
+    # Save to html
+    m.save(filesave)
 
-        print(f'Successfully saved file: {filesave}')
-        print('\n\n')
+    print(f'Successfully saved file: {filesave}')
+    print('\n\n')
 
 
 def arc_data_dataframe(filepath):
@@ -203,7 +217,7 @@ def arc_map(ds, filename):
 
 def add_layer(map_obj, df, column):
     """
-    Adds a colormapped layer with circle markers (detailed analysis) or colorline (smaller html generation).
+    Adds a colormapped colorline layer (smaller html generation), exact values come from the point inspector.
     """
 
     if df[column].isna().all():
@@ -247,23 +261,8 @@ def add_layer(map_obj, df, column):
         opacity=0.8
     ).add_to(layer)
 
-    # Use circle markers for popups with exact location value
-
-    # for _, row in tqdm(df.iterrows(), total=len(df), bar_format='{bar}', colour='white'):
-    #     value = row[column]
-    #
-    #     if pd.notna(value):
-    #         folium.CircleMarker(
-    #             location=(row["lat_DGPS_deg"], row["lon_DGPS_deg"]),
-    #             radius=20,
-    #             color=linear(value),
-    #             show=True,
-    #             fill=True,
-    #             fill_opacity=0.8,
-    #             stroke=False,
-    #             popup=folium.Popup(f"{column}: {value:.1f} @ {row['StartTime_seconds']}")  # ADD in UTC time for current row
-    #         ).add_to(layer)
-
+    # Exact values on click come from the map-wide point inspector (add_point_inspector)
+    # rather than per-row popups, which made maps too slow and huge.
 
     # Add colormap key
     map_obj.add_child(linear)
@@ -327,6 +326,143 @@ def add_vector_map(map_obj, df, column):
 
     layer.add_to(map_obj)
 
+
+class PointInspector(MacroElement):
+    """
+    Leaflet click handler that shows every variable and the UTC time at the nearest fix.
+    Ships one compact, time-sorted sample array and builds a grid bucket index once client side.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var map = {{ this._parent.get_name() }};
+            var data = {{ this.samples }};
+            var cell = {{ this.cell_deg }};
+            var maxDist = {{ this.max_dist_deg }};
+
+            // Grid bucket index, built once
+            var grid = {};
+            for (var i = 0; i < data.t.length; i++) {
+                var key = Math.floor(data.lat[i] / cell) + ',' + Math.floor(data.lon[i] / cell);
+                (grid[key] = grid[key] || []).push(i);
+            }
+
+            function nearest(lat, lon) {
+                var coslat = Math.cos(lat * Math.PI / 180);
+                var ci = Math.floor(lat / cell), cj = Math.floor(lon / cell);
+                var maxRing = Math.ceil(maxDist / (cell * coslat)) + 1;
+                var best = -1, bestD = Infinity;
+
+                // Search rings of cells outward, stop once no closer cell can remain
+                for (var r = 0; r <= maxRing; r++) {
+                    if (best >= 0 && bestD <= (r - 1) * cell * coslat) break;
+                    for (var di = -r; di <= r; di++) {
+                        for (var dj = -r; dj <= r; dj++) {
+                            if (Math.max(Math.abs(di), Math.abs(dj)) !== r) continue;
+                            var bucket = grid[(ci + di) + ',' + (cj + dj)];
+                            if (!bucket) continue;
+                            for (var k = 0; k < bucket.length; k++) {
+                                var idx = bucket[k];
+                                var dy = data.lat[idx] - lat;
+                                var dx = (data.lon[idx] - lon) * coslat;
+                                var d = Math.sqrt(dx * dx + dy * dy);
+                                if (d < bestD) { bestD = d; best = idx; }
+                            }
+                        }
+                    }
+                }
+                return bestD <= maxDist ? best : -1;
+            }
+
+            function utc(seconds) {
+                var d = new Date(Date.UTC(data.year, data.month - 1, data.day) + seconds * 1000);
+                return d.toISOString().replace('T', ' ').substring(0, 19) + ' UTC';
+            }
+
+            map.on('click', function(e) {
+                var idx = nearest(e.latlng.lat, e.latlng.lng);
+                if (idx < 0) return;
+
+                var html = '<b>' + utc(data.t[idx]) + '</b><br>' +
+                           data.lat[idx].toFixed(5) + ', ' + data.lon[idx].toFixed(5);
+                for (var name in data.vars) {
+                    var v = data.vars[name][idx];
+                    html += '<br>' + name + ': ' + (v === null ? 'NaN' : v);
+                }
+
+                L.popup()
+                    .setLatLng([data.lat[idx], data.lon[idx]])
+                    .setContent(html)
+                    .openOn(map);
+            });
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, samples, cell_deg=0.005, max_dist_deg=0.005):
+        super().__init__()
+        self._name = 'PointInspector'
+        self.samples = samples
+        self.cell_deg = cell_deg
+        self.max_dist_deg = max_dist_deg
+
+
+def inspect_columns(df):
+    """
+    Every numeric ARC variable except time and position, skipping columns that are all NaN.
+    """
+
+    skip = {'StartTime_seconds', 'lat_DGPS_deg', 'lon_DGPS_deg'}
+
+    return [col for col in df.columns
+            if col not in skip and pd.api.types.is_numeric_dtype(df[col]) and df[col].notna().any()]
+
+
+def inspector_samples(df, arcdate, columns=None):
+    """
+    Packs the dataframe into a compact, time-sorted columnar dict for the point inspector.
+    - Times are StartTime_seconds (UTC seconds after midnight of arcdate).
+    - columns defaults to every numeric variable (inspect_columns).
+    - Keeps 7 significant figures (the ICARTT files carry fewer), NaN becomes null.
+    """
+
+    date = str(arcdate)
+    df = df.sort_values('StartTime_seconds')
+
+    if columns is None:
+        columns = inspect_columns(df)
+
+    def compact(series, digits=None):
+        # digits: fixed decimals (time, position), otherwise significant figures
+        return [None if pd.isna(v) or math.isinf(v)
+                else round(float(v), digits) if digits is not None
+                else float(f"{v:.7g}") for v in series]
+
+    samples = {
+        'year': int(date[:4]),
+        'month': int(date[4:6]),
+        'day': int(date[6:8]),
+        't': compact(df['StartTime_seconds'], 1),
+        'lat': compact(df['lat_DGPS_deg'], 5),
+        'lon': compact(df['lon_DGPS_deg'], 5),
+        'vars': {col: compact(df[col]) for col in columns if col in df.columns},
+    }
+
+    return json.dumps(samples, separators=(',', ':'))
+
+
+def add_point_inspector(map_obj, df, arcdate, columns=None):
+    """
+    Adds on-demand point inspection: clicking the map opens a popup with all variables (or just
+    columns, if given) and UTC time at the nearest fix, replacing per-point CircleMarker popups.
+    """
+
+    print("Adding point inspector...")
+
+    PointInspector(inspector_samples(df, arcdate, columns)).add_to(map_obj)
+
+
 if __name__ == "__main__":
     main()
 